@@ -1,12 +1,22 @@
 import csv
+import datetime
 import os
 import sys
+import time
 import yaml
 from pathlib import Path
 
 import pytest
 
-from geocoder_tester.base import assert_search, assert_reverse, CONFIG, API_TYPES
+from geocoder_tester.base import (assert_search, assert_reverse, search,
+                                  reverse, parse_point, CONFIG, API_TYPES,
+                                  HttpSearchException)
+from geocoder_tester.cache_probe import CacheProbe
+from geocoder_tester.heatmap import Heatmap
+from geocoder_tester.history import History
+from geocoder_tester.metrics import Metrics
+from geocoder_tester.ordering import (ORDERS, located, order_items, replay,
+                                      replay_report)
 
 
 def pytest_collect_file(parent, path):
@@ -23,12 +33,49 @@ def pytest_collect_file(parent, path):
 
 def pytest_itemcollected(item):
     dirs = item.session.fspath.bestrelpath(item.fspath.dirpath()).split(os.sep)
+    markers = []
     for d in dirs:
         if d not in (".", "geocoder_tester", "world"):
+            markers.append(d)
             item.add_marker(d)
             if item.nodeid in CONFIG.get('COMPARE_WITH', []):
                 item.add_marker(
                     pytest.mark.xfail(run=not CONFIG['SKIP_XFAIL']))
+    item.marker_dir = '/'.join(markers) or 'world'
+
+
+def pytest_collection_modifyitems(session, config, items):
+    # Remember the file order, --order-replay uses it as its baseline.
+    for i, item in enumerate(items):
+        item.position = i
+    order = config.getoption('--order')
+    if order is None and CONFIG['CACHE_PROBE']:
+        # Defeat any locality between consecutive queries, so that the
+        # first request of each test really hits a cold cache.
+        order = 'random'
+    if order:
+        items[:] = order_items(items, order, config.getoption('--order-seed'))
+
+
+def pytest_runtestloop(session):
+    if not session.config.getoption('--order-replay') \
+            or session.config.option.collectonly:
+        return None
+    items = [item for item in session.items
+             if hasattr(item, 'replay') and located(item)]
+    items.sort(key=lambda item: item.position)
+    if CONFIG['MAX_RUN']:
+        items = items[:CONFIG['MAX_RUN']]
+    orders = session.config.getoption('--order-replay').split(',')
+    stats = replay(items, orders,
+                   rounds=session.config.getoption('--order-replay-rounds'),
+                   seed=session.config.getoption('--order-seed'))
+    import _pytest.config
+    writer = _pytest.config.create_terminal_writer(session.config, sys.stdout)
+    writer.sep('=', 'ORDER REPLAY ({} located tests)'.format(len(items)))
+    for line in replay_report(stats):
+        print(line)
+    return True
 
 
 def pytest_addoption(parser):
@@ -76,6 +123,90 @@ def pytest_addoption(parser):
         '--skip-xfail', action="store_true",  dest="skip_xfail",
         help="Do not run the tests known to fail when in compare mode."
     )
+    parser.addoption(
+        '--cache-probe', action="store_true", dest="cache_probe",
+        help=("Run the tests in random order and send each query twice "
+              "to report cold versus warm latencies.")
+    )
+    parser.addoption(
+        '--fast-decode', action="store_true", dest="fast_decode",
+        help=("Decode responses with orjson when installed and only keep "
+              "the result properties needed by the tests.")
+    )
+    parser.addoption(
+        '--history',
+        dest="history",
+        help="Path of the SQLite database where to append the run history."
+    )
+    parser.addoption(
+        '--build-label',
+        dest="build_label",
+        help="Label of the tested build, stored in the run history."
+    )
+    parser.addoption(
+        '--heatmap',
+        dest="heatmap",
+        help=("Path where to save a GeoJSON grid of the latencies and "
+              "failures of the tests.")
+    )
+    parser.addoption(
+        '--heatmap-precision',
+        dest="heatmap_precision",
+        type=int,
+        default=4,
+        help="Geohash length of the heatmap cells (default: 4)."
+    )
+    parser.addoption(
+        '--metrics-port',
+        dest="metrics_port",
+        type=int,
+        help=("Expose live metrics of the run in Prometheus text format "
+              "on this port.")
+    )
+    parser.addoption(
+        '--metrics-host',
+        dest="metrics_host",
+        default='127.0.0.1',
+        help="Address to bind the metrics endpoint to (default: 127.0.0.1)."
+    )
+    parser.addoption(
+        '--metrics-grace',
+        dest="metrics_grace",
+        type=float,
+        default=30,
+        help=("Seconds to keep serving the metrics after the end of the "
+              "run (default: 30).")
+    )
+    parser.addoption(
+        '--order',
+        dest="order",
+        choices=ORDERS,
+        help=("Order in which to run the tests: file, random, or along a "
+              "space-filling curve (hilbert, geohash).")
+    )
+    parser.addoption(
+        '--order-seed',
+        dest="order_seed",
+        type=int,
+        help="Seed of the random order."
+    )
+    parser.addoption(
+        '--order-replay',
+        dest="order_replay",
+        nargs='?',
+        const='file,random,hilbert',
+        help=("Instead of running the tests, replay the queries of the "
+              "located tests in each of the given comma separated orders "
+              "(default: file,random,hilbert) and compare their "
+              "throughput and latency.")
+    )
+    parser.addoption(
+        '--order-replay-rounds',
+        dest="order_replay_rounds",
+        type=int,
+        help=("Number of times to replay each order (default: the number "
+              "of orders, so that each order gets replayed first once).")
+    )
 
 
 def pytest_configure(config):
@@ -85,6 +216,20 @@ def pytest_configure(config):
     CONFIG['LOOSE_COMPARE'] = config.getoption('--loose-compare')
     CONFIG['GEOJSON'] = config.getoption('--geojson')
     CONFIG['SKIP_XFAIL'] = config.getoption('--skip-xfail')
+    CONFIG['CACHE_PROBE'] = config.getoption('--cache-probe')
+    CONFIG['FAST_DECODE'] = config.getoption('--fast-decode')
+    HEATMAP.precision = config.getoption('--heatmap-precision')
+    global RUN_STARTED
+    RUN_STARTED = datetime.datetime.now()
+    if config.getoption('--order-replay'):
+        for order in config.getoption('--order-replay').split(','):
+            if order not in ORDERS:
+                raise pytest.UsageError(
+                    "Unknown order '{}' in --order-replay, choose among "
+                    "{}.".format(order, ', '.join(ORDERS)))
+    if config.getoption('--metrics-port'):
+        METRICS.serve(config.getoption('--metrics-host'),
+                      config.getoption('--metrics-port'))
     if config.getoption('--compare-report'):
         with open(config.getoption('--compare-report')) as f:
             CONFIG['COMPARE_WITH'] = []
@@ -114,9 +259,91 @@ def pytest_unconfigure(config):
                 print(failed)
                 total += 1
         writer.sep('=', 'TOTAL NEW PASSING: {}'.format(total), green=True)
+    if config.getoption('--history') and HISTORY:
+        history = History(config.getoption('--history'))
+        history.add_run(RUN_STARTED, config.getoption('--build-label'),
+                        CONFIG['API_TYPE'], CONFIG['API_URL'], HISTORY)
+        history.close()
+    if config.getoption('--heatmap'):
+        with open(config.getoption('--heatmap'), mode='w',
+                  encoding='utf-8') as f:
+            f.write(HEATMAP.to_geojson())
+    if config.getoption('--cache-probe'):
+        import _pytest.config
+        writer = _pytest.config.create_terminal_writer(config, sys.stdout)
+        writer.sep('=', 'CACHE PROBE (cold versus warm latency)')
+        for line in CACHE_PROBE.report():
+            print(line)
+    if config.getoption('--metrics-port'):
+        grace = config.getoption('--metrics-grace')
+        if grace > 0:
+            # Give the scrapers a chance to collect the final counts.
+            print('Serving the final metrics for {:g}s (--metrics-grace), '
+                  'press Ctrl-C to stop.'.format(grace))
+            try:
+                time.sleep(grace)
+            except KeyboardInterrupt:
+                pass
+        METRICS.shutdown()
 
 
 REPORTS = 0
+CACHE_PROBE = CacheProbe()
+HISTORY = []
+RUN_STARTED = None
+HEATMAP = Heatmap()
+METRICS = Metrics()
+
+
+def pytest_runtest_setup(item):
+    # Every test gets its own log, including plain python tests calling
+    # assert_search directly.
+    CONFIG['QUERY_LOG'] = []
+    CONFIG['DIRECTORY'] = getattr(item, 'marker_dir', 'world')
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if report.when != 'call' and not (report.when == 'setup'
+                                      and report.skipped):
+        return
+    directory = getattr(item, 'marker_dir', 'world')
+    queries = CONFIG['QUERY_LOG'] if report.when == 'call' else []
+    if CONFIG['CACHE_PROBE']:
+        CACHE_PROBE.add(CONFIG['API_TYPE'], directory, item.nodeid, queries)
+    cold = [q for q in queries if not q['warm']]
+    if item.config.getoption('--history'):
+        HISTORY.append({
+            'nodeid': item.nodeid,
+            'directory': directory,
+            'outcome': report_outcome(report),
+            'latency': sum(q['latency'] for q in cold) if cold else None,
+            'size': sum(q['size'] for q in cold) if cold else None,
+            'url': cold[-1]['url'] if cold else None,
+        })
+    if item.config.getoption('--metrics-port'):
+        METRICS.add_test(CONFIG['API_TYPE'], directory,
+                         report_outcome(report), queries,
+                         http_error=call.excinfo is not None and
+                         call.excinfo.errisinstance(HttpSearchException))
+    if item.config.getoption('--heatmap') and cold \
+            and hasattr(item, 'coordinates'):
+        coordinates = item.coordinates()
+        if coordinates:
+            HEATMAP.add(*coordinates,
+                        latency=sum(q['latency'] for q in cold),
+                        failed=report_outcome(report) == 'failed')
+
+
+def report_outcome(report):
+    """ Return passed, failed or skipped, known failures (xfail) counting
+        as what they really did.
+    """
+    if report.when == 'call' and hasattr(report, 'wasxfail'):
+        return 'failed' if report.skipped else 'passed'
+    return report.outcome
 
 
 def pytest_runtest_logreport(report):
@@ -167,18 +394,8 @@ class BaseFlatItem(pytest.Item):
     def runtest(self):
         if self.skip is not None:
             pytest.skip(msg=self.skip)
-        kwargs = {
-            'query': self.query,
-            'expected': self.expected,
-            'lang': self.lang,
-            'comment': self.comment
-        }
-        if self.lat and self.lon:
-            kwargs['center'] = [self.lat, self.lon]
-        if self.limit:
-            kwargs['limit'] = self.limit
-        if self.detail:
-            kwargs['detail'] = self.detail
+        kwargs = self.query_params()
+        kwargs['expected'] = self.expected
 
         if self.query:
             assert_search(**kwargs)
@@ -187,6 +404,57 @@ class BaseFlatItem(pytest.Item):
         else:
             pytest.skip(msg="Need at least parameters 'query' or 'lat/lon'.")
 
+    def query_params(self):
+        params = {
+            'query': self.query,
+            'lang': self.lang,
+            'comment': self.comment
+        }
+        if self.lat and self.lon:
+            params['center'] = [self.lat, self.lon]
+        # Same default as assert_search and assert_reverse, so that replays
+        # get the same responses as the tests.
+        params['limit'] = self.limit or 1
+        if self.detail:
+            params['detail'] = self.detail
+        return params
+
+    def replay(self):
+        """ Send the query of the test without checking the results.
+            Return the queries sent and whether the API answered with an
+            error.
+        """
+        queries = CONFIG['QUERY_LOG'] = []
+        CONFIG['DIRECTORY'] = self.marker_dir
+        if self.skip is not None:
+            return queries, False
+        params = self.query_params()
+        try:
+            if self.query:
+                search(**params)
+            elif 'center' in params:
+                reverse(**params)
+        except HttpSearchException:
+            return queries, True
+        except pytest.skip.Exception:
+            pass
+        return queries, False
+
+    def coordinates(self):
+        """ Return the (lat, lon) the test is located at as floats: its
+            center if any, else its expected coordinate. Return None when
+            there is none or it cannot be parsed.
+        """
+        if self.lat and self.lon:
+            return parse_point(self.lat, self.lon)
+        expected = self.expected
+        if isinstance(expected, list):
+            expected = expected[0] if expected else {}
+        if 'coordinate' in expected:
+            return parse_point(*(str(expected['coordinate']).split(',')
+                                 + [None, None])[:2])
+        return None
+
     def repr_failure(self, excinfo):
         """ called when self.runtest() raises an exception. """
         return str(excinfo.value)
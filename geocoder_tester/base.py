@@ -1,5 +1,6 @@
 import json
 import re
+import time
 
 import requests
 from geopy import Point
@@ -7,6 +8,11 @@ from geopy.distance import distance
 from unidecode import unidecode
 from pytest import skip
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 POTSDAM = [52.3879, 13.0582]
 BERLIN = [52.519854, 13.438596]
 MUNICH = [43.731245, 7.419744]
@@ -17,9 +23,22 @@ CONFIG = {
     'LOOSE_COMPARE': False,
     'MAX_RUN': 0,  # means no limit
     'GEOJSON': False,
+    'CACHE_PROBE': False,
+    'FAST_DECODE': False,
     'FAILED': [],
+    'QUERY_LOG': [],
+    # Marker directory of the running test, and requests in flight per
+    # (endpoint, directory).
+    'DIRECTORY': 'world',
+    'IN_FLIGHT': {},
 }
 
+# Properties displayed in the results table of a failing search.
+REPORT_KEYS = [
+    'name', 'osm_key', 'osm_value', 'osm_id', 'housenumber', 'street',
+    'postcode', 'city', 'country'
+]
+
 http = requests.Session()
 
 class GenericApi:
@@ -30,10 +49,11 @@ class GenericApi:
         normally choose the specific API type you connect with.
     """
 
-    def search(self, **params):
-        return self._transform_search_results(
+    def search(self, fields=None, **params):
+        return self._project_results(self._transform_search_results(
             self._send_query(self.search_url(),
-                             params=self.search_params(**params)))
+                             params=self.search_params(**params),
+                             endpoint='search')), fields)
 
     def search_params(self, query, **kwargs):
         params = {"q": query}
@@ -49,10 +69,11 @@ class GenericApi:
     def search_url(self):
         return CONFIG['API_URL']
 
-    def reverse(self, **params):
-        return self._transform_search_results(
+    def reverse(self, fields=None, **params):
+        return self._project_results(self._transform_search_results(
             self._send_query(self.reverse_url(),
-                             params=self.reverse_params(**params)))
+                             params=self.reverse_params(**params),
+                             endpoint='reverse')), fields)
 
     def reverse_params(self, center, **kwargs):
         skip("Reverse not supported by the Generic API implementation")
@@ -60,16 +81,59 @@ class GenericApi:
     def reverse_url(self):
         return CONFIG['API_URL']
 
-    def _send_query(self, url, params):
-        r = http.get(url, params=params,
-                     headers={'user-agent': 'geocode-tester'})
+    def _send_query(self, url, params, endpoint):
+        r = self._get(url, params, endpoint)
+        if CONFIG['CACHE_PROBE'] and r.status_code == 200:
+            # Repeat the very same query right away, so the backend
+            # caches are as warm as they can get.
+            r = self._get(url, params, endpoint, warm=True)
         if not r.status_code == 200:
             raise HttpSearchException(error="Non 200 response")
+        if CONFIG['FAST_DECODE']:
+            return json_loads(r.content)
         return r.json()
 
+    def _get(self, url, params, endpoint, warm=False):
+        key = (endpoint, CONFIG['DIRECTORY'])
+        CONFIG['IN_FLIGHT'][key] = CONFIG['IN_FLIGHT'].get(key, 0) + 1
+        start = time.perf_counter()
+        try:
+            r = http.get(url, params=params,
+                         headers={'user-agent': 'geocode-tester'})
+        finally:
+            CONFIG['IN_FLIGHT'][key] -= 1
+        CONFIG['QUERY_LOG'].append({
+            'endpoint': endpoint,
+            'url': r.url,
+            'status': r.status_code,
+            'latency': time.perf_counter() - start,
+            'size': len(r.content),
+            'warm': warm,
+        })
+        return r
+
     def _transform_search_results(self, results):
         return results
 
+    def _project_results(self, results, fields):
+        """ Strip each feature down to its geometry and the given
+            properties. Returns the results untouched when fields is None.
+        """
+        if fields is None:
+            return results
+        features = []
+        for result in results['features']:
+            properties = result.get('properties') or {}
+            geocoding = properties.get('geocoding', properties)
+            projected = {k: geocoding[k] for k in fields if k in geocoding}
+            if 'geocoding' in properties:
+                projected = {'geocoding': projected}
+            feature = {'type': 'Feature', 'properties': projected}
+            if 'geometry' in result:
+                feature['geometry'] = result['geometry']
+            features.append(feature)
+        return {'type': 'FeatureCollection', 'features': features}
+
 class NominatimApi(GenericApi):
     """ Access proxy for Nominatim APIs. The API URL must be the base
         URL without /search or /reverse path.
@@ -234,10 +298,7 @@ class SearchException(Exception):
         if self.message:
             lines.append('# Message: {}'.format(self.message))
         lines.append('# Results were:')
-        keys = [
-            'name', 'osm_key', 'osm_value', 'osm_id', 'housenumber', 'street',
-            'postcode', 'city', 'country', 'lat', 'lon', 'distance'
-        ]
+        keys = REPORT_KEYS + ['lat', 'lon', 'distance']
         for k in self.expected:
             if k not in keys:
                 keys.append(k)
@@ -296,6 +357,18 @@ def search(**params):
 def reverse(**params):
     return API_TYPES[CONFIG['API_TYPE']]().reverse(**params)
 
+def parse_point(lat, lon):
+    """ Return (lat, lon) as floats, or None if they are not valid
+        coordinates.
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
 def normalize(s):
     return normalize_pattern.sub(' ', unidecode(s.lower()))
 normalize_pattern = re.compile(r'[^\w]')
@@ -307,14 +380,29 @@ def compare_values(get, expected):
     return get == expected
 
 
+def result_fields(expected):
+    """ Return the result properties needed to check and report the
+        expected values, or None when the full results should be kept.
+    """
+    # The --geojson output dumps the results with all their properties.
+    if not CONFIG['FAST_DECODE'] or CONFIG['GEOJSON']:
+        return None
+    fields = list(REPORT_KEYS)
+    for s in (expected if isinstance(expected, list) else [expected]):
+        fields.extend(k for k in s if k not in fields)
+    return fields
+
+
 def assert_search(query, expected, limit=1, **params):
-    results = search(query=query, limit=limit, **params)
+    results = search(query=query, limit=limit,
+                     fields=result_fields(expected), **params)
     api = API_TYPES[CONFIG['API_TYPE']]()
     check_results(results, expected, query,
                   api.search_params(query=query, limit=limit, **params))
 
 def assert_reverse(center, expected, limit=1, **params):
-    results = reverse(center=center, limit=limit, **params)
+    results = reverse(center=center, limit=limit,
+                      fields=result_fields(expected), **params)
     api = API_TYPES[CONFIG['API_TYPE']]()
     check_results(results, expected, '{0},{1}'.format(*center),
                   api.reverse_params(center=center, limit=limit, **params))
@@ -0,0 +1,63 @@
+import statistics
+from collections import defaultdict
+
+
+def quantile(values, q):
+    """ Return the q-quantile (0 <= q <= 1) of a non-empty list of values,
+        using linear interpolation between the closest ranks.
+    """
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+class CacheProbe:
+    """ Collects cold and warm latencies of the queries sent in cache
+        probe mode and summarizes the cache speedup per API type, endpoint
+        and marker directory.
+    """
+
+    def __init__(self):
+        self.groups = defaultdict(list)
+
+    def add(self, api_type, directory, nodeid, queries):
+        cold = [q for q in queries if not q['warm']]
+        warm = [q for q in queries if q['warm']]
+        for c, w in zip(cold, warm):
+            key = (api_type, c['endpoint'], directory)
+            self.groups[key].append((nodeid, c['url'], c['latency'],
+                                     w['latency']))
+
+    def report(self, slowest=10):
+        lines = []
+        header = '{:<10} {:<8} {:<35} {:>6} {:>10} {:>10} {:>7} {:>7} {:>7}'
+        lines.append(header.format('api', 'endpoint', 'directory', 'count',
+                                   'cold ms', 'warm ms', 'p10 x',
+                                   'p50 x', 'p90 x'))
+        for key in sorted(self.groups):
+            probes = self.groups[key]
+            cold = [c for _, _, c, _ in probes]
+            warm = [w for _, _, _, w in probes]
+            speedups = [c / w for _, _, c, w in probes if w > 0]
+            lines.append(
+                '{:<10} {:<8} {:<35} {:>6} {:>10.1f} {:>10.1f} '
+                '{:>7.2f} {:>7.2f} {:>7.2f}'.format(
+                    *key, len(probes),
+                    statistics.median(cold) * 1000,
+                    statistics.median(warm) * 1000,
+                    quantile(speedups, 0.1) if speedups else 0,
+                    quantile(speedups, 0.5) if speedups else 0,
+                    quantile(speedups, 0.9) if speedups else 0))
+        probes = [(w, c, nodeid, url)
+                  for group in self.groups.values()
+                  for nodeid, url, c, w in group]
+        if probes:
+            lines.append('')
+            lines.append('Slowest queries when warm:')
+            for w, c, nodeid, url in sorted(probes, reverse=True)[:slowest]:
+                lines.append('{:>10.1f} ms warm {:>10.1f} ms cold  {}'.format(
+                    w * 1000, c * 1000, nodeid))
+                lines.append('{:>36}{}'.format('', url))
+        return lines
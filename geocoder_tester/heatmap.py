@@ -0,0 +1,93 @@
+import json
+import statistics
+from collections import defaultdict
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lon, precision):
+    """ Encode a coordinate into a geohash of the given length. """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    out = []
+    bits = 0
+    value = 0
+    even = True
+    while len(out) < precision:
+        if even:
+            rng, coord = lon_range, lon
+        else:
+            rng, coord = lat_range, lat
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(BASE32[value])
+            bits = value = 0
+    return ''.join(out)
+
+
+def geohash_bbox(code):
+    """ Return the (west, south, east, north) bounds of a geohash cell. """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in code:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lon_range[0], lat_range[0], lon_range[1], lat_range[1]
+
+
+class Heatmap:
+    """ Aggregates the latency and failures of the tests into geohash
+        cells, and exports them as a GeoJSON FeatureCollection.
+    """
+
+    def __init__(self, precision=4):
+        self.precision = precision
+        self.cells = defaultdict(list)
+
+    def add(self, lat, lon, latency, failed):
+        cell = geohash(lat, lon, self.precision)
+        self.cells[cell].append((latency, failed))
+
+    def to_geojson(self):
+        features = []
+        for cell in sorted(self.cells):
+            results = self.cells[cell]
+            latencies = [l for l, _ in results if l is not None]
+            failures = sum(1 for _, failed in results if failed)
+            west, south, east, north = geohash_bbox(cell)
+            features.append({
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[west, south], [east, south],
+                                     [east, north], [west, north],
+                                     [west, south]]],
+                },
+                "properties": {
+                    "geohash": cell,
+                    "count": len(results),
+                    "failures": failures,
+                    "failure_rate": failures / len(results),
+                    "latency_median": (statistics.median(latencies) * 1000
+                                       if latencies else None),
+                    "latency_max": (max(latencies) * 1000
+                                    if latencies else None),
+                },
+            })
+        return json.dumps({"type": "FeatureCollection", "features": features})
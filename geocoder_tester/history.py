@@ -0,0 +1,216 @@
+""" Local history of the test runs, stored in a SQLite database.
+
+Runs are recorded with `py.test --history=path/to/history.db`. The
+recorded history can then be queried with:
+
+    python -m geocoder_tester.history path/to/history.db slowdowns
+    python -m geocoder_tester.history path/to/history.db flaky
+    python -m geocoder_tester.history path/to/history.db trends
+"""
+import argparse
+import sqlite3
+import statistics
+from collections import defaultdict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    label TEXT,
+    api_type TEXT NOT NULL,
+    api_url TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    nodeid TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    latency REAL,
+    size INTEGER,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS results_nodeid ON results(nodeid, url, run_id);
+"""
+
+
+class History:
+    """ Access to the run history database. """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add_run(self, started, label, api_type, api_url, results):
+        """ Store a run and its results, a list of dicts with the keys
+            nodeid, directory, outcome, latency, size and url. As node ids
+            are not unique in the corpus (e.g. reverse rows have no query),
+            a result is identified by its nodeid and request URL. Runs
+            without results are not stored, so that they don't hide the
+            last real run.
+        """
+        if not results:
+            return None
+        with self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (started, label, api_type, api_url) '
+                'VALUES (?, ?, ?, ?)',
+                (started.isoformat(timespec='seconds'),
+                 label, api_type, api_url))
+            run_id = cursor.lastrowid
+            self.db.executemany(
+                'INSERT INTO results (run_id, nodeid, directory, outcome, '
+                'latency, size, url) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, r['nodeid'], r['directory'], r['outcome'],
+                  r['latency'], r['size'], r['url']) for r in results])
+        return run_id
+
+    def runs(self, limit):
+        """ Return the ids and labels of the last runs made against the
+            same API (type and URL) as the latest run, oldest first.
+        """
+        rows = self.db.execute(
+            'SELECT id, label FROM runs '
+            'WHERE (api_type, api_url) = (SELECT api_type, api_url FROM runs '
+            '                             ORDER BY id DESC LIMIT 1) '
+            'ORDER BY id DESC LIMIT ?', (limit,))
+        return list(reversed(rows.fetchall()))
+
+    def _results(self, run_ids, columns):
+        marks = ','.join('?' * len(run_ids))
+        return self.db.execute(
+            'SELECT run_id, {} FROM results WHERE run_id IN ({}) '
+            'ORDER BY run_id, nodeid, url'.format(columns, marks), run_ids)
+
+    def slowdowns(self, window=5, factor=1.5, min_delta=0.05):
+        """ Compare the latency of each test in the last run with the
+            median latency of the same test over the `window` previous
+            runs. Yield (nodeid, url, baseline, latency) for the tests which
+            got slower by more than `factor` and `min_delta` seconds.
+        """
+        runs = [run_id for run_id, _ in self.runs(window + 1)]
+        if len(runs) < 2:
+            return
+        last = runs[-1]
+        latencies = defaultdict(list)
+        current = {}
+        for run_id, nodeid, url, latency in self._results(
+                runs, 'nodeid, url, latency'):
+            if latency is None or url is None:
+                continue
+            if run_id == last:
+                current[(nodeid, url)] = latency
+            else:
+                latencies[(nodeid, url)].append(latency)
+        slower = []
+        for key, latency in current.items():
+            if not latencies[key]:
+                continue
+            baseline = statistics.median(latencies[key])
+            if latency > baseline * factor and \
+                    latency - baseline > min_delta:
+                slower.append((latency / baseline, key, baseline, latency))
+        for _, (nodeid, url), baseline, latency in sorted(slower,
+                                                          reverse=True):
+            yield nodeid, url, baseline, latency
+
+    def flaky(self, window=10, min_flips=1):
+        """ Yield (nodeid, url, flips, outcomes) for the tests that flipped
+            between pass and fail over the last `window` runs.
+        """
+        runs = [run_id for run_id, _ in self.runs(window)]
+        outcomes = defaultdict(dict)
+        for run_id, nodeid, url, outcome in self._results(
+                runs, 'nodeid, url, outcome'):
+            if url is not None and outcome in ('passed', 'failed'):
+                outcomes[(nodeid, url)][run_id] = outcome
+        flaky = []
+        for key, by_run in outcomes.items():
+            values = [by_run[run_id] for run_id in sorted(by_run)]
+            flips = sum(1 for a, b in zip(values, values[1:]) if a != b)
+            if flips >= min_flips:
+                flaky.append((flips, key, values))
+        for flips, (nodeid, url), values in sorted(flaky, reverse=True):
+            yield nodeid, url, flips, values
+
+    def trends(self, window=5):
+        """ Yield (directory, [(label, count, pass rate, median latency)])
+            for each marker directory over the last `window` runs.
+        """
+        runs = self.runs(window)
+        labels = dict(runs)
+        stats = defaultdict(lambda: defaultdict(list))
+        for run_id, directory, outcome, latency in self._results(
+                [run_id for run_id, _ in runs],
+                'directory, outcome, latency'):
+            stats[directory][run_id].append((outcome, latency))
+        for directory in sorted(stats):
+            points = []
+            for run_id, _ in runs:
+                results = stats[directory].get(run_id)
+                if not results:
+                    continue
+                ran = [o for o, _ in results if o in ('passed', 'failed')]
+                latencies = [l for _, l in results if l is not None]
+                points.append((
+                    labels[run_id] or '#{}'.format(run_id),
+                    len(results),
+                    ran.count('passed') / len(ran) if ran else None,
+                    statistics.median(latencies) if latencies else None))
+            yield directory, points
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the history of geocoder-tester runs.")
+    parser.add_argument('database', help="Path to the history database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    slowdowns = commands.add_parser(
+        'slowdowns', help="Tests whose latency got worse in the last run.")
+    slowdowns.add_argument('--window', type=int, default=5,
+                           help="Number of previous runs in the baseline.")
+    slowdowns.add_argument('--factor', type=float, default=1.5,
+                           help="Minimal slowdown ratio to report.")
+    slowdowns.add_argument('--min-delta', type=float, default=50,
+                           help="Minimal slowdown in milliseconds.")
+    flaky = commands.add_parser(
+        'flaky', help="Tests flipping between pass and fail.")
+    flaky.add_argument('--window', type=int, default=10,
+                       help="Number of runs to look at.")
+    flaky.add_argument('--min-flips', type=int, default=1,
+                       help="Minimal number of flips to report.")
+    trends = commands.add_parser(
+        'trends', help="Pass rate and latency per marker directory.")
+    trends.add_argument('--window', type=int, default=5,
+                        help="Number of runs to look at.")
+    args = parser.parse_args()
+
+    history = History(args.database)
+    if args.command == 'slowdowns':
+        for nodeid, url, baseline, latency in history.slowdowns(
+                args.window, args.factor, args.min_delta / 1000):
+            print('{:>10.1f} ms -> {:>10.1f} ms  {}'.format(
+                baseline * 1000, latency * 1000, nodeid))
+            print('{:>30}{}'.format('', url))
+    elif args.command == 'flaky':
+        for nodeid, url, flips, outcomes in history.flaky(args.window,
+                                                          args.min_flips):
+            print('{:>3} flips  {}  {}'.format(
+                flips, ''.join(o[0].upper() for o in outcomes), nodeid))
+            print('{:>12}{}'.format('', url))
+    elif args.command == 'trends':
+        for directory, points in history.trends(args.window):
+            print(directory)
+            for label, count, rate, latency in points:
+                print('    {:<20} {:>6} tests  {:>7}  {:>10}'.format(
+                    label, count,
+                    '-' if rate is None else '{:.1%}'.format(rate),
+                    '-' if latency is None
+                    else '{:.1f} ms'.format(latency * 1000)))
+    history.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from geocoder_tester.base import CONFIG
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def labels(**values):
+    def escape(value):
+        return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
+    return '{' + ','.join('{}="{}"'.format(k, escape(v))
+                          for k, v in values.items()) + '}'
+
+
+class Metrics:
+    """ Running counters of a test run, exposed in the Prometheus text
+        format by a local HTTP server.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tests = defaultdict(int)
+        self.http_errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+        self.server = None
+
+    def add_test(self, api_type, directory, outcome, queries, http_error):
+        with self.lock:
+            self.tests[(api_type, directory, outcome)] += 1
+            if http_error:
+                self.http_errors[(api_type, directory)] += 1
+            for query in queries:
+                key = (api_type, query['endpoint'], directory)
+                self.bytes[key] += query['size']
+                self.latency_sum[key] += query['latency']
+                self.latency_count[key] += 1
+                for i, bound in enumerate(BUCKETS):
+                    if query['latency'] <= bound:
+                        self.buckets[key][i] += 1
+
+    def render(self):
+        lines = [
+            '# HELP geocoder_tester_tests_total Tests run, by outcome.',
+            '# TYPE geocoder_tester_tests_total counter',
+        ]
+        with self.lock:
+            for (api_type, directory, outcome), value in \
+                    sorted(self.tests.items()):
+                lines.append('geocoder_tester_tests_total{} {}'.format(
+                    labels(api_type=api_type, directory=directory,
+                           outcome=outcome), value))
+            lines.extend([
+                '# HELP geocoder_tester_http_errors_total Tests failed '
+                'with a non 200 response.',
+                '# TYPE geocoder_tester_http_errors_total counter',
+            ])
+            for (api_type, directory), value in \
+                    sorted(self.http_errors.items()):
+                lines.append('geocoder_tester_http_errors_total{} {}'.format(
+                    labels(api_type=api_type, directory=directory), value))
+            lines.extend([
+                '# HELP geocoder_tester_response_bytes_total Bytes '
+                'received from the API.',
+                '# TYPE geocoder_tester_response_bytes_total counter',
+            ])
+            for (api_type, endpoint, directory), value in \
+                    sorted(self.bytes.items()):
+                lines.append(
+                    'geocoder_tester_response_bytes_total{} {}'.format(
+                        labels(api_type=api_type, endpoint=endpoint,
+                               directory=directory), value))
+            lines.extend([
+                '# HELP geocoder_tester_request_duration_seconds Latency '
+                'of the API requests.',
+                '# TYPE geocoder_tester_request_duration_seconds histogram',
+            ])
+            for key in sorted(self.latency_count):
+                api_type, endpoint, directory = key
+                for bound, value in zip(BUCKETS, self.buckets[key]):
+                    lines.append(
+                        'geocoder_tester_request_duration_seconds_bucket'
+                        '{} {}'.format(labels(api_type=api_type,
+                                              endpoint=endpoint,
+                                              directory=directory,
+                                              le=bound), value))
+                lines.append(
+                    'geocoder_tester_request_duration_seconds_bucket'
+                    '{} {}'.format(labels(api_type=api_type,
+                                          endpoint=endpoint,
+                                          directory=directory, le='+Inf'),
+                                   self.latency_count[key]))
+                common = labels(api_type=api_type, endpoint=endpoint,
+                                directory=directory)
+                lines.append(
+                    'geocoder_tester_request_duration_seconds_sum'
+                    '{} {}'.format(common, self.latency_sum[key]))
+                lines.append(
+                    'geocoder_tester_request_duration_seconds_count'
+                    '{} {}'.format(common, self.latency_count[key]))
+        lines.extend([
+            '# HELP geocoder_tester_requests_in_flight API requests '
+            'waiting for a response.',
+            '# TYPE geocoder_tester_requests_in_flight gauge',
+        ])
+        # Copied first, the tests may add keys while we render.
+        for (endpoint, directory), value in \
+                sorted(CONFIG['IN_FLIGHT'].copy().items()):
+            lines.append('geocoder_tester_requests_in_flight{} {}'.format(
+                labels(api_type=CONFIG['API_TYPE'], endpoint=endpoint,
+                       directory=directory), value))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host, port):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,113 @@
+import random
+import time
+
+from geocoder_tester.cache_probe import quantile
+from geocoder_tester.heatmap import geohash
+
+ORDERS = ('file', 'random', 'hilbert', 'geohash')
+
+
+def hilbert_index(lat, lon, bits=16):
+    """ Return the position of a coordinate along a Hilbert curve covering
+        the world on a 2^bits x 2^bits grid.
+    """
+    side = 1 << bits
+    x = min(int((lon + 180) / 360 * side), side - 1)
+    y = min(int((lat + 90) / 180 * side), side - 1)
+    d = 0
+    s = side >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so that the curve stays continuous.
+        if ry == 0:
+            if rx == 1:
+                x = side - 1 - x
+                y = side - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def located(item):
+    """ Return the (lat, lon) of an item as floats, or None. """
+    return getattr(item, 'coordinates', lambda: None)()
+
+
+def order_items(items, order, seed=None):
+    """ Return the items sorted in the given order. In the spatial orders
+        (hilbert, geohash), the items without coordinates come last, in
+        file order.
+    """
+    if order == 'file':
+        return list(items)
+    if order == 'random':
+        items = list(items)
+        random.Random(seed).shuffle(items)
+        return items
+    if order == 'hilbert':
+        key = hilbert_index
+    elif order == 'geohash':
+        def key(lat, lon):
+            return geohash(lat, lon, 12)
+    else:
+        raise ValueError('Unknown order: {}'.format(order))
+    keyed = []
+    rest = []
+    for item in items:
+        coordinates = located(item)
+        if coordinates:
+            keyed.append((key(*coordinates), len(keyed), item))
+        else:
+            rest.append(item)
+    return [item for _, _, item in sorted(keyed)] + rest
+
+
+def replay(items, orders, rounds=None, seed=None):
+    """ Send the queries of the items once per order and round, without
+        checking the results. Return per order the wall time, the
+        latencies of the requests and the number of HTTP errors.
+
+        The sequence of orders is rotated at each round, so that they
+        all get their turn to run first against cold caches. By default,
+        there are as many rounds as orders. The warm repeats sent in cache
+        probe mode are left out of the latencies.
+    """
+    if rounds is None:
+        rounds = len(orders)
+    stats = {order: {'time': 0.0, 'latencies': [], 'errors': 0}
+             for order in orders}
+    for i in range(rounds):
+        for order in orders[i % len(orders):] + orders[:i % len(orders)]:
+            start = time.perf_counter()
+            for item in order_items(items, order, seed):
+                queries, error = item.replay()
+                stats[order]['latencies'].extend(
+                    q['latency'] for q in queries if not q['warm'])
+                stats[order]['errors'] += error
+            stats[order]['time'] += time.perf_counter() - start
+    return stats
+
+
+def replay_report(stats):
+    lines = []
+    header = '{:<10} {:>8} {:>9} {:>8} {:>9} {:>9} {:>9} {:>7}'
+    lines.append(header.format('order', 'requests', 'wall s', 'req/s',
+                               'p50 ms', 'p90 ms', 'p99 ms', 'errors'))
+    for order, stat in stats.items():
+        latencies = stat['latencies']
+        if not latencies:
+            lines.append(header.format(order, 0, '-', '-', '-', '-', '-',
+                                       stat['errors']))
+            continue
+        lines.append(
+            '{:<10} {:>8} {:>9.2f} {:>8.1f} {:>9.1f} {:>9.1f} {:>9.1f} '
+            '{:>7}'.format(
+                order, len(latencies), stat['time'],
+                len(latencies) / stat['time'] if stat['time'] else 0,
+                quantile(latencies, 0.5) * 1000,
+                quantile(latencies, 0.9) * 1000,
+                quantile(latencies, 0.99) * 1000,
+                stat['errors']))
+    return lines
@@ -0,0 +1,104 @@
+import copy
+
+import pytest
+
+from geocoder_tester.base import (CONFIG, REPORT_KEYS, GenericApi, PeliasApi,
+                                  parse_point, result_fields)
+
+
+def test_parse_point():
+    assert parse_point('48.85', '2.35') == (48.85, 2.35)
+    assert parse_point(48.85, 2.35) == (48.85, 2.35)
+
+
+@pytest.mark.parametrize('lat, lon', [
+    # Malformed expected_coordinate values found in the corpus.
+    ('48.15234/11.55635', '3000'),
+    ('18.468714°', '-69.850217'),
+    ('', ''), (None, None), ('abc', '1'), ('91', '0'), ('0', '181'),
+])
+def test_parse_point_invalid(lat, lon):
+    assert parse_point(lat, lon) is None
+
+
+NOMINATIM_RESULTS = {
+    'type': 'FeatureCollection',
+    'geocoding': {'version': '0.1.0'},
+    'features': [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]},
+        'properties': {'geocoding': {
+            'name': 'Paris', 'city': 'Paris', 'osm_id': 7444,
+            'admin': {'level2': 'France'}, 'extra': 'x' * 100,
+        }},
+    }],
+}
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'FAST_DECODE', True)
+    monkeypatch.setitem(CONFIG, 'GEOJSON', False)
+    return CONFIG
+
+
+def test_project_results_nested_geocoding():
+    results = GenericApi()._project_results(copy.deepcopy(NOMINATIM_RESULTS),
+                                            ['name', 'city', 'missing'])
+    assert results == {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {'geocoding': {'name': 'Paris', 'city': 'Paris'}},
+            'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]},
+        }],
+    }
+
+
+def test_project_results_flat_properties():
+    results = {'features': [{'type': 'Feature',
+                             'properties': {'name': 'Paris', 'extra': 1}}]}
+    projected = GenericApi()._project_results(results, ['name'])
+    assert projected['features'] == [
+        {'type': 'Feature', 'properties': {'name': 'Paris'}}]
+
+
+def test_project_results_passthrough():
+    results = copy.deepcopy(NOMINATIM_RESULTS)
+    assert GenericApi()._project_results(results, None) is results
+
+
+def test_pelias_postcode_survives_projection(config):
+    results = {'features': [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [13.4, 52.5]},
+        'properties': {'name': 'Berlin', 'postalcode': '10117',
+                       'layer': 'locality'},
+    }]}
+    api = PeliasApi()
+    projected = api._project_results(api._transform_search_results(results),
+                                     result_fields({'postcode': '10117'}))
+    assert projected['features'][0]['properties']['postcode'] == '10117'
+    assert 'layer' not in projected['features'][0]['properties']
+
+
+def test_result_fields(config):
+    fields = result_fields({'name': 'Paris', 'coordinate': '1,2,3'})
+    assert fields[:len(REPORT_KEYS)] == REPORT_KEYS
+    assert fields.count('name') == 1
+    assert 'coordinate' in fields
+
+
+def test_result_fields_expected_list(config):
+    # YAML tests can expect several results.
+    fields = result_fields([{'name': 'Paris'}, {'wikidata': 'Q90'},
+                            {'name': 'Paris', 'type': 'city'}])
+    assert fields == REPORT_KEYS + ['wikidata', 'type']
+
+
+def test_result_fields_keep_full_results(config):
+    config['GEOJSON'] = True
+    assert result_fields({'name': 'Paris'}) is None
+    config['GEOJSON'] = False
+    config['FAST_DECODE'] = False
+    assert result_fields({'name': 'Paris'}) is None
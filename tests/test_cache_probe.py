@@ -0,0 +1,30 @@
+from geocoder_tester.cache_probe import CacheProbe, quantile
+
+
+def query(url, latency, warm):
+    return {'endpoint': 'reverse', 'url': url, 'status': 200,
+            'latency': latency, 'size': 100, 'warm': warm}
+
+
+def test_quantile():
+    assert quantile([3, 1, 2], 0) == 1
+    assert quantile([3, 1, 2], 0.5) == 2
+    assert quantile([3, 1, 2], 1) == 3
+    assert quantile([0, 10], 0.25) == 2.5
+    assert quantile([7], 0.9) == 7
+
+
+def test_report_shows_url_of_slow_queries():
+    probe = CacheProbe()
+    # Reverse rows share the same node id, only the URL tells them apart.
+    probe.add('photon', 'world', 'test_reverse.csv::',
+              [query('http://api/reverse?lat=1&lon=2', 0.2, False),
+               query('http://api/reverse?lat=1&lon=2', 0.1, True)])
+    probe.add('photon', 'world', 'test_reverse.csv::',
+              [query('http://api/reverse?lat=3&lon=4', 0.4, False),
+               query('http://api/reverse?lat=3&lon=4', 0.3, True)])
+    lines = probe.report()
+    assert lines[1].split()[:4] == ['photon', 'reverse', 'world', '2']
+    slowest = lines[lines.index('Slowest queries when warm:') + 1:]
+    assert slowest[1].strip() == 'http://api/reverse?lat=3&lon=4'
+    assert slowest[3].strip() == 'http://api/reverse?lat=1&lon=2'
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from geocoder_tester.heatmap import Heatmap, geohash, geohash_bbox
+
+
+def test_geohash_known_value():
+    # Paris, Notre-Dame.
+    assert geohash(48.8530, 2.3498, 6) == 'u09tvm'
+    assert geohash(-33.8688, 151.2093, 5) == 'r3gx2'
+
+
+@pytest.mark.parametrize('lat, lon', [
+    (48.8566, 2.3522), (-33.8688, 151.2093), (0, 0), (89.99, -179.99),
+    (-89.99, 179.99),
+])
+@pytest.mark.parametrize('precision', [1, 4, 7])
+def test_geohash_bbox_contains_point(lat, lon, precision):
+    west, south, east, north = geohash_bbox(geohash(lat, lon, precision))
+    assert west <= lon <= east
+    assert south <= lat <= north
+
+
+def test_geohash_prefixes():
+    code = geohash(52.52, 13.405, 8)
+    for precision in range(1, 8):
+        assert geohash(52.52, 13.405, precision) == code[:precision]
+
+
+def test_heatmap_aggregates_cells():
+    heatmap = Heatmap(precision=4)
+    heatmap.add(48.8566, 2.3522, 0.1, False)
+    heatmap.add(48.8570, 2.3530, 0.3, True)
+    heatmap.add(-33.8688, 151.2093, 0.2, False)
+    features = json.loads(heatmap.to_geojson())['features']
+    cells = {f['properties']['geohash']: f['properties'] for f in features}
+    assert cells['u09t'] == {
+        'geohash': 'u09t', 'count': 2, 'failures': 1, 'failure_rate': 0.5,
+        'latency_median': 200.0, 'latency_max': 300.0}
+    assert cells['r3gx']['count'] == 1
+    ring = features[0]['geometry']['coordinates'][0]
+    assert ring[0] == ring[-1]
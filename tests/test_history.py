@@ -0,0 +1,90 @@
+import datetime
+
+from geocoder_tester.history import History
+
+STARTED = datetime.datetime(2026, 1, 1)
+
+
+def url(lat):
+    return 'http://api/reverse?lat={}&lon=0'.format(lat)
+
+
+def result(lat, outcome='passed', latency=0.1, nodeid='test_reverse.csv::'):
+    return {'nodeid': nodeid, 'directory': 'world', 'outcome': outcome,
+            'latency': latency, 'size': 100, 'url': url(lat)}
+
+
+def add_runs(history, *runs, api_type='photon', api_url='http://api'):
+    for results in runs:
+        history.add_run(STARTED, None, api_type, api_url, results)
+
+
+def test_flaky_ignores_rows_sharing_a_nodeid():
+    history = History(':memory:')
+    # Rows with the same node id but different outcomes, identical runs.
+    run = [result(0, 'passed'), result(1, 'failed'), result(2, 'passed')]
+    add_runs(history, run, run, run)
+    assert list(history.flaky()) == []
+
+
+def test_flaky_compares_runs():
+    history = History(':memory:')
+    add_runs(history,
+             [result(0, 'passed'), result(1, 'failed')],
+             [result(0, 'failed'), result(1, 'failed')],
+             [result(0, 'passed'), result(1, 'failed')])
+    assert list(history.flaky()) == [
+        ('test_reverse.csv::', url(0), 2, ['passed', 'failed', 'passed'])]
+
+
+def test_slowdowns_per_query():
+    history = History(':memory:')
+    add_runs(history,
+             [result(0, latency=0.1), result(1, latency=1.0)],
+             [result(0, latency=0.1), result(1, latency=1.0)],
+             [result(0, latency=0.5), result(1, latency=1.0)])
+    assert list(history.slowdowns()) == [('test_reverse.csv::', url(0), 0.1, 0.5)]
+
+
+def test_slowdowns_after_empty_run():
+    history = History(':memory:')
+    add_runs(history,
+             [result(0, latency=0.1)],
+             [result(0, latency=0.5)])
+    assert history.add_run(STARTED, None, 'photon', 'http://api', []) is None
+    assert list(history.slowdowns()) == [('test_reverse.csv::', url(0), 0.1, 0.5)]
+
+
+def test_baseline_uses_same_api_only():
+    history = History(':memory:')
+    add_runs(history, [result(0, latency=0.01)], api_type='nominatim')
+    add_runs(history, [result(0, latency=0.5)], [result(0, latency=0.5)])
+    assert list(history.slowdowns()) == []
+    assert [label for _, label in history.runs(10)] == [None, None]
+
+
+def test_trends():
+    history = History(':memory:')
+    history.add_run(STARTED, 'v1', 'photon', 'http://api',
+                    [result(0, 'passed', 0.1), result(1, 'failed', 0.3)])
+    assert list(history.trends()) == [('world', [('v1', 2, 0.5, 0.2)])]
+
+
+def test_inserted_row_keeps_baselines():
+    history = History(':memory:')
+    before = [result(0, 'passed', 0.1), result(2, 'failed', 1.0)]
+    # A row inserted in the middle of the file shifts the following rows.
+    after = [result(0, 'passed', 0.1), result(1, 'passed', 0.1),
+             result(2, 'failed', 1.0)]
+    add_runs(history, before, before, after)
+    assert list(history.slowdowns()) == []
+    assert list(history.flaky()) == []
+
+
+def test_results_without_url_are_not_compared():
+    history = History(':memory:')
+    skipped = dict(result(0, 'skipped', None), url=None)
+    failed = dict(result(1, 'failed', None), url=None)
+    add_runs(history, [skipped, dict(failed, outcome='passed')],
+             [skipped, failed])
+    assert list(history.flaky()) == []
@@ -0,0 +1,62 @@
+import urllib.request
+
+from geocoder_tester.base import CONFIG
+from geocoder_tester.metrics import Metrics, labels
+
+
+def query(latency, size=100):
+    return {'endpoint': 'search', 'url': 'http://api/?q=x', 'status': 200,
+            'latency': latency, 'size': size, 'warm': False}
+
+
+def test_labels_are_escaped():
+    assert labels(a='x', b='say "hi"\\\n') == \
+        '{a="x",b="say \\"hi\\"\\\\\\n"}'
+
+
+def test_render():
+    metrics = Metrics()
+    metrics.add_test('photon', 'france', 'passed', [query(0.02)], False)
+    metrics.add_test('photon', 'france', 'failed', [query(3.0, 50)], True)
+    lines = metrics.render().splitlines()
+    common = 'api_type="photon",endpoint="search",directory="france"'
+    assert ('geocoder_tester_tests_total{api_type="photon",'
+            'directory="france",outcome="passed"} 1') in lines
+    assert ('geocoder_tester_http_errors_total{api_type="photon",'
+            'directory="france"} 1') in lines
+    assert 'geocoder_tester_response_bytes_total{%s} 150' % common in lines
+    # Buckets are cumulative.
+    assert ('geocoder_tester_request_duration_seconds_bucket'
+            '{%s,le="0.01"} 0' % common) in lines
+    assert ('geocoder_tester_request_duration_seconds_bucket'
+            '{%s,le="0.025"} 1' % common) in lines
+    assert ('geocoder_tester_request_duration_seconds_bucket'
+            '{%s,le="5.0"} 2' % common) in lines
+    assert ('geocoder_tester_request_duration_seconds_bucket'
+            '{%s,le="+Inf"} 2' % common) in lines
+    assert ('geocoder_tester_request_duration_seconds_count'
+            '{%s} 2' % common) in lines
+
+
+def test_serve():
+    metrics = Metrics()
+    metrics.serve('127.0.0.1', 0)
+    try:
+        port = metrics.server.server_address[1]
+        with urllib.request.urlopen(
+                'http://127.0.0.1:{}/metrics'.format(port)) as response:
+            body = response.read().decode('utf-8')
+        assert '# TYPE geocoder_tester_tests_total counter' in body
+    finally:
+        metrics.shutdown()
+
+
+def test_in_flight_per_directory(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'API_TYPE', 'photon')
+    monkeypatch.setitem(CONFIG, 'IN_FLIGHT', {('search', 'france'): 1,
+                                              ('reverse', 'world'): 0})
+    lines = Metrics().render().splitlines()
+    assert ('geocoder_tester_requests_in_flight{api_type="photon",'
+            'endpoint="search",directory="france"} 1') in lines
+    assert ('geocoder_tester_requests_in_flight{api_type="photon",'
+            'endpoint="reverse",directory="world"} 0') in lines
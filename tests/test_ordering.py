@@ -0,0 +1,106 @@
+import pytest
+
+from geocoder_tester.ordering import hilbert_index, order_items, replay
+
+
+class Item:
+
+    def __init__(self, name, lat=None, lon=None):
+        self.name = name
+        self.point = (lat, lon) if lat is not None else None
+        self.replayed = []
+
+    def coordinates(self):
+        return self.point
+
+    def replay(self):
+        self.replayed.append(True)
+        # As in cache probe mode: a cold request and its warm repeat.
+        return [{'latency': 0.01, 'warm': False},
+                {'latency': 0.001, 'warm': True}], False
+
+
+def cell_of(d, bits):
+    """ Inverse of the Hilbert curve, to check adjacency of positions. """
+    side = 1 << bits
+    x = y = 0
+    s = 1
+    t = d
+    while s < side:
+        rx = 1 & (t // 2)
+        ry = 1 & (t ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        t //= 4
+        s *= 2
+    return x, y
+
+
+@pytest.mark.parametrize('bits', [1, 2, 3, 4])
+def test_hilbert_index_is_a_continuous_bijection(bits):
+    side = 1 << bits
+    cells = {}
+    for x in range(side):
+        for y in range(side):
+            # Center of the grid cell, in degrees.
+            lon = (x + 0.5) / side * 360 - 180
+            lat = (y + 0.5) / side * 180 - 90
+            cells[hilbert_index(lat, lon, bits)] = (x, y)
+    assert sorted(cells) == list(range(side * side))
+    for d in range(side * side - 1):
+        (x1, y1), (x2, y2) = cells[d], cells[d + 1]
+        assert abs(x1 - x2) + abs(y1 - y2) == 1
+        assert cell_of(d, bits) == cells[d]
+
+
+def test_hilbert_index_bounds():
+    assert hilbert_index(-90, -180) == 0
+    assert 0 <= hilbert_index(90, 180) < 1 << 32
+
+
+def test_order_items_spatial_orders_keep_unlocated_last():
+    items = [Item('paris', 48.85, 2.35), Item('none'),
+             Item('sydney', -33.87, 151.21), Item('paris2', 48.86, 2.36)]
+    for order in ('hilbert', 'geohash'):
+        names = [i.name for i in order_items(items, order)]
+        assert names[-1] == 'none'
+        assert abs(names.index('paris') - names.index('paris2')) == 1
+
+
+def test_order_items_file_and_random():
+    items = [Item(str(i), 0, i) for i in range(20)]
+    assert order_items(items, 'file') == items
+    shuffled = order_items(items, 'random', seed=1)
+    assert shuffled == order_items(items, 'random', seed=1)
+    assert sorted(shuffled, key=lambda i: int(i.name)) == items
+    with pytest.raises(ValueError):
+        order_items(items, 'unknown')
+
+
+def test_replay_counts_requests_per_order():
+    items = [Item('a', 1, 1), Item('b', 2, 2)]
+    stats = replay(items, ['file', 'hilbert'], rounds=1)
+    assert len(items[0].replayed) == 2
+    for order in ('file', 'hilbert'):
+        assert stats[order]['latencies'] == [0.01, 0.01]
+        assert stats[order]['errors'] == 0
+
+
+def test_replay_rotates_orders(monkeypatch):
+    import geocoder_tester.ordering
+    sequence = []
+
+    def order_items(items, order, seed=None):
+        sequence.append(order)
+        return items
+    monkeypatch.setattr(geocoder_tester.ordering, 'order_items', order_items)
+    replay([Item('a', 1, 1)], ['file', 'random', 'hilbert'])
+    # By default, each order is replayed first once.
+    assert sequence == ['file', 'random', 'hilbert',
+                        'random', 'hilbert', 'file',
+                        'hilbert', 'file', 'random']